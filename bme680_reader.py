@@ -15,11 +15,20 @@ Raspberry Pi Pico W用
 """
 
 from machine import Pin, I2C, WDT
+try:
+    from machine import lightsleep
+except ImportError:
+    lightsleep = None
 import time
+import sys
 import struct
 import network
-import urequests
+import usocket
+import json
 import gc
+import micropython
+from micropython import const
+import urandom
 
 # ============================================
 # WiFi設定（優先順位順）
@@ -33,6 +42,11 @@ WIFI_NETWORKS = [
 # ============================================
 AMBIENT_CHANNEL_ID = 98573
 AMBIENT_WRITE_KEY = "1259d6fac2a1af55"
+AMBIENT_HOST = "ambidata.io"
+
+# 送信先パスとペイロード（起動時に1回だけ生成し、送信毎に値のみ更新して再利用）
+_AMBIENT_PATH = "/api/v2/channels/%d/data" % AMBIENT_CHANNEL_ID
+_AMBIENT_PAYLOAD = {"writeKey": AMBIENT_WRITE_KEY, "d1": 0.0, "d2": 0.0, "d3": 0.0}
 
 # データ送信間隔（秒）
 SEND_INTERVAL = 600  # 10分 = 600秒
@@ -40,21 +54,34 @@ SEND_INTERVAL = 600  # 10分 = 600秒
 # ============================================
 # ウォッチドッグタイマー設定
 # ============================================
-WDT_TIMEOUT_MS = 8388  # 最大値: 8388ms（約8.3秒）
+WDT_TIMEOUT_MS = const(8388)  # 最大値: 8388ms（約8.3秒）
 # 注意: Raspberry Pi Pico WのWDTは最大8388msまで
 
+# ============================================
+# 省電力設定
+# ============================================
+LIGHTSLEEP_ENABLED = False  # Trueで待機中にmachine.lightsleepを使用（USBシリアルが停止するため開発時はFalse）
+
 # ============================================
 # 堅牢化設定
 # ============================================
-I2C_MAX_RETRIES = 3  # I2C読み取り最大再試行回数
-I2C_FAIL_THRESHOLD = 5  # I2C連続失敗でリセットするしきい値
-WIFI_MAX_RETRIES = 4  # WiFi接続最大再試行回数
-HTTP_MAX_RETRIES = 3  # HTTP送信最大再試行回数
+I2C_MAX_RETRIES = const(3)  # I2C読み取り最大再試行回数
+I2C_FAIL_THRESHOLD = const(5)  # I2C連続失敗でリセットするしきい値
+WIFI_MAX_RETRIES = const(4)  # WiFi接続最大再試行回数
+HTTP_MAX_RETRIES = const(3)  # HTTP送信最大再試行回数
+HTTP_TIMEOUT_S = const(WDT_TIMEOUT_MS // 3000)  # 接続・送受信1回ごとのタイムアウト（秒、WDT周期内に収める）
+WIFI_SCAN_CACHE_S = const(30)  # WiFiスキャン結果の再利用期間（秒）
+GC_FREE_THRESHOLD = const(8192)  # 空きメモリがこれ未満ならGC実行（bytes）
+
+# コンソール出力用区切り線
+SEP = "-" * 50
+PRINT_EVERY_N = const(10)  # 計測値を詳細表示する間隔（ループ回数）
 
 # ============================================
 # BME680 I2Cアドレス
 # ============================================
-BME680_ADDR = 0x77  # または 0x76（SDOピンの接続による）
+BME680_ADDR = const(0x77)  # または 0x76（SDOピンの接続による）
+I2C_FREQ = const(400000)  # I2Cクロック（Hz）- BME680はファストモード（400kHz）対応
 
 # ============================================
 # キャリブレーション設定
@@ -65,16 +92,45 @@ TEMP_OFFSET = 0.0  # 温度オフセット（℃）- 2026-01-21リセット（M5
 HUMIDITY_OFFSET = 0.0  # 湿度オフセット（%RH）- 2026-01-21リセット（M5Stack比較検証用）
 PRESSURE_OFFSET = 0.0  # 気圧オフセット（hPa）- 2026-01-21リセット（M5Stack比較検証用）
 
-# BME680レジスタアドレス
-BME680_REG_CHIP_ID = 0xD0
-BME680_REG_CTRL_HUM = 0x72
-BME680_REG_CTRL_MEAS = 0x74
-BME680_REG_CONFIG = 0x75
-BME680_REG_CTRL_GAS_1 = 0x71
-BME680_REG_CTRL_GAS_0 = 0x70
-BME680_REG_GAS_WAIT_0 = 0x64
-BME680_REG_RES_HEAT_0 = 0x5A
-BME680_REG_DATA = 0x1D
+# 整数補正演算の内部単位（0.01℃ / 0.001%RH / Pa）に換算したオフセット
+_TEMP_OFFSET_X100 = int(round(TEMP_OFFSET * 100))
+_HUMIDITY_OFFSET_X1000 = int(round(HUMIDITY_OFFSET * 1000))
+_PRESSURE_OFFSET_PA = int(round(PRESSURE_OFFSET * 100))
+
+# BME680レジスタアドレス（const()でバイトコードに埋め込む）
+BME680_REG_CHIP_ID = const(0xD0)
+BME680_REG_CTRL_HUM = const(0x72)
+BME680_REG_CTRL_MEAS = const(0x74)
+BME680_REG_CONFIG = const(0x75)
+BME680_REG_CTRL_GAS_1 = const(0x71)
+BME680_REG_CTRL_GAS_0 = const(0x70)
+BME680_REG_GAS_WAIT_0 = const(0x64)
+BME680_REG_RES_HEAT_0 = const(0x5A)
+BME680_REG_DATA = const(0x1D)
+BME680_REG_MEAS_STATUS = const(0x1D)  # meas_status_0（bit7: new_data_0, bit5: measuring）
+BME680_NEW_DATA_MSK = const(0x80)
+BME680_MEASURING_MSK = const(0x20)
+
+# 計測完了ポーリング設定
+MEAS_POLL_INTERVAL_MS = const(5)  # ポーリング間隔（ms）
+MEAS_POLL_MAX = const(40)  # 最大ポーリング回数
+
+# ガス抵抗計算用ルックアップテーブル（BME680データシート）
+_GAS_LUT1 = (1.0, 1.0, 1.0, 1.0, 1.0, 0.99, 1.0, 0.992,
+             1.0, 1.0, 0.998, 0.995, 1.0, 0.99, 1.0, 1.0)
+_GAS_LUT2 = (8000000.0, 4000000.0, 2000000.0, 1000000.0,
+             499500.4995, 248262.1648, 125000.0, 63004.03226,
+             31281.28128, 15625.0, 7812.5, 3906.25,
+             1953.125, 976.5625, 488.28125, 244.140625)
+
+
+@micropython.native
+def _div_trunc(a, b):
+    """0方向に切り捨てる整数除算（C言語互換、b > 0）"""
+    q = a // b
+    if q < 0 and q * b != a:
+        q += 1
+    return q
 
 
 class BME680:
@@ -84,6 +140,21 @@ class BME680:
         self.i2c = i2c
         self.addr = addr
 
+        # I2C用バッファを事前確保（読み書き毎のヒープ確保を避ける）
+        self._data_buf = bytearray(15)
+        self._byte_buf = bytearray(1)
+        self._cmd_buf = bytearray(1)
+
+        # read_dataの戻り値（毎回同じdictを更新して返す）
+        self._result = {
+            'temperature': 0.0,
+            'pressure': 0.0,
+            'humidity': 0.0,
+            'gas_resistance': None,
+            'gas_valid': False,
+            'heat_stable': False
+        }
+
         # チップIDを確認
         chip_id = self._read_byte(BME680_REG_CHIP_ID)
         if chip_id != 0x61:
@@ -102,72 +173,68 @@ class BME680:
         self._setup()
 
     def _read_byte(self, reg):
-        time.sleep_ms(10)
-        return self.i2c.readfrom_mem(self.addr, reg, 1)[0]
+        self.i2c.readfrom_mem_into(self.addr, reg, self._byte_buf)
+        return self._byte_buf[0]
 
     def _read_bytes(self, reg, length):
-        time.sleep_ms(10)
         return self.i2c.readfrom_mem(self.addr, reg, length)
 
+    def _read_bytes_into(self, reg, buf):
+        self.i2c.readfrom_mem_into(self.addr, reg, buf)
+
     def _write_byte(self, reg, value):
-        time.sleep_ms(10)
-        self.i2c.writeto_mem(self.addr, reg, bytes([value]))
+        self._cmd_buf[0] = value
+        self.i2c.writeto_mem(self.addr, reg, self._cmd_buf)
 
     def _read_calibration(self):
         """キャリブレーションデータを読み取る"""
+        # 0x89-0xA1と0xE1-0xF0は離れているため1回のバースト読み出しにはまとめず、
+        # 待機なしで連続して読み出す（計3回のI2Cトランザクション）
         # 温度・気圧キャリブレーション (0x89-0xA1)
         coeff1 = self._read_bytes(0x89, 25)
         # 湿度キャリブレーション (0xE1-0xE8)
         coeff2 = self._read_bytes(0xE1, 16)
-        # ガスキャリブレーション
-        coeff3 = self._read_bytes(0x00, 3)
-
-        # 温度キャリブレーション
-        self.par_t1 = (coeff1[0] | (coeff1[1] << 8))
-        self.par_t2 = self._signed_short(coeff1[2] | (coeff1[3] << 8))
-        self.par_t3 = coeff1[4]
-
-        # 気圧キャリブレーション
-        self.par_p1 = (coeff1[5] | (coeff1[6] << 8))
-        self.par_p2 = self._signed_short(coeff1[7] | (coeff1[8] << 8))
-        self.par_p3 = coeff1[9]
-        self.par_p4 = self._signed_short(coeff1[11] | (coeff1[12] << 8))
-        self.par_p5 = self._signed_short(coeff1[13] | (coeff1[14] << 8))
-        self.par_p6 = coeff1[15]
-        self.par_p7 = coeff1[16]
-        self.par_p8 = self._signed_short(coeff1[17] | (coeff1[18] << 8))
-        self.par_p9 = self._signed_short(coeff1[19] | (coeff1[20] << 8))
-        self.par_p10 = coeff1[21]
-
-        # 湿度キャリブレーション
+        # ガスキャリブレーション・ヒーターレンジ (0x00-0x04)
+        coeff3 = self._read_bytes(0x00, 5)
+
+        # 温度・気圧キャリブレーション (0x89-0x9E、0x93は未使用のため2回に分けて展開)
+        # 符号はBosch bme68xの型定義に合わせる（t3/p3/p6/p7はint8_t、p10はuint8_t）
+        (self.par_t1, self.par_t2, self.par_t3,
+         self.par_p1, self.par_p2, self.par_p3) = struct.unpack_from("<HhbHhb", coeff1, 0)
+        (self.par_p4, self.par_p5, self.par_p6, self.par_p7,
+         self.par_p8, self.par_p9, self.par_p10) = struct.unpack_from("<hhbbhhB", coeff1, 11)
+
+        # 湿度キャリブレーション（h1/h2は12bit値のためビット演算で展開）
         self.par_h1 = (coeff2[2] << 4) | (coeff2[1] & 0x0F)
         self.par_h2 = (coeff2[0] << 4) | (coeff2[1] >> 4)
-        self.par_h3 = coeff2[3]
-        self.par_h4 = coeff2[4]
-        self.par_h5 = coeff2[5]
-        self.par_h6 = coeff2[6]
-        self.par_h7 = coeff2[7]
+        # h3/h4/h5/h7はint8_t、h6はuint8_t（Bosch bme68xの型定義）
+        (self.par_h3, self.par_h4, self.par_h5,
+         self.par_h6, self.par_h7) = struct.unpack_from("<3bBb", coeff2, 3)
+
+        # 整数補正演算用の定数を事前計算（Bosch bme68x 整数版に準拠）
+        self._t1_x2 = self.par_t1 << 1
+        self._t3_x16 = self.par_t3 << 4
+        self._p3_x32 = self.par_p3 << 5
+        self._p4_x65536 = self.par_p4 << 16
+        self._p7_x128 = self.par_p7 << 7
+        self._h1x16 = self.par_h1 << 4
+        self._h6_x128 = self.par_h6 << 7
 
         # ガスキャリブレーション
         self.par_g1 = coeff3[2]
-        self.par_g2 = self._signed_short(coeff3[0] | (coeff3[1] << 8))
-        self.par_g3 = self._read_byte(0x02)
+        self.par_g2 = struct.unpack_from("<h", coeff3, 0)[0]
+        self.par_g3 = coeff3[2]
 
         # ヒーターレンジ
-        self.res_heat_range = (self._read_byte(0x02) >> 4) & 0x03
-        self.res_heat_val = self._read_byte(0x00)
-        self.range_sw_err = (self._read_byte(0x04) & 0xF0) >> 4
-
-    def _signed_short(self, val):
-        if val >= 0x8000:
-            return val - 0x10000
-        return val
+        self.res_heat_range = (coeff3[2] >> 4) & 0x03
+        self.res_heat_val = coeff3[0]
+        self.range_sw_err = (coeff3[4] & 0xF0) >> 4
 
     def _setup(self):
         """センサーを設定"""
         # ソフトリセット
         self._write_byte(0xE0, 0xB6)
-        time.sleep_ms(10)
+        time.sleep_ms(10)  # リセット完了待ち（Bosch純正ドライバと同じ10ms）
 
         # 湿度オーバーサンプリング x2
         self._write_byte(BME680_REG_CTRL_HUM, 0x02)
@@ -199,27 +266,30 @@ class BME680:
         gas_wait = self._calc_gas_wait(duration)
         self._write_byte(BME680_REG_GAS_WAIT_0, gas_wait)
 
-    def _calc_gas_wait(self, duration):
+    @micropython.viper
+    def _calc_gas_wait(self, duration: int) -> int:
         """ガス待機時間を計算"""
         if duration >= 4096:
             return 0xFF
 
         factor = 0
         while duration > 63:
-            duration = duration // 4
+            duration = duration >> 2  # 4で割る
             factor += 1
 
-        return int(duration + (factor * 64))
+        return duration + (factor << 6)
 
-    def read_data(self, retries=I2C_MAX_RETRIES):
+    def read_data(self, retries=I2C_MAX_RETRIES, wdt=None):
         """
         全センサーデータを読み取る（再試行機能付き）
 
         Args:
             retries: 最大再試行回数
+            wdt: ウォッチドッグタイマー（None可）
 
         Returns:
             dict: センサーデータ、失敗時はNone
+                  （同じdictを再利用するため、次回呼び出しで内容が上書きされる）
         """
         for attempt in range(retries):
             try:
@@ -227,109 +297,112 @@ class BME680:
                 # 温度・気圧オーバーサンプリング x4, 強制モード
                 self._write_byte(BME680_REG_CTRL_MEAS, 0x55)
 
-                # 計測完了を待機
-                time.sleep_ms(200)
+                # 計測完了を待機（new_dataビットをポーリング）
+                for _ in range(MEAS_POLL_MAX):
+                    status = self._read_byte(BME680_REG_MEAS_STATUS)
+                    if (status & BME680_NEW_DATA_MSK) and not (status & BME680_MEASURING_MSK):
+                        break
+                    time.sleep_ms(MEAS_POLL_INTERVAL_MS)
+                    if wdt:
+                        wdt.feed()
+                else:
+                    raise RuntimeError("計測完了待ちタイムアウト")
 
                 # データ読み取り
-                data = self._read_bytes(BME680_REG_DATA, 15)
+                data = self._data_buf
+                self._read_bytes_into(BME680_REG_DATA, data)
 
                 # ADC値を抽出
-                adc_pres = (data[2] << 12) | (data[3] << 4) | (data[4] >> 4)
-                adc_temp = (data[5] << 12) | (data[6] << 4) | (data[7] >> 4)
-                adc_hum = (data[8] << 8) | data[9]
-
-                # 温度計算
-                temperature = self._calc_temperature(adc_temp)
-
-                # 気圧計算
-                pressure = self._calc_pressure(adc_pres)
-
-                # 湿度計算
-                humidity = self._calc_humidity(adc_hum)
-
-                # キャリブレーション適用
-                temperature_calibrated = temperature + TEMP_OFFSET
-                humidity_calibrated = humidity + HUMIDITY_OFFSET
-                pressure_calibrated = pressure + PRESSURE_OFFSET
-
-                return {
-                    'temperature': temperature_calibrated,
-                    'temperature_raw': temperature,
-                    'pressure': pressure_calibrated,
-                    'humidity': humidity_calibrated,
-                    'gas_resistance': None,
-                    'gas_valid': False,
-                    'heat_stable': False
-                }
+                p_msb, p_xlsb = struct.unpack_from(">HB", data, 2)
+                t_msb, t_xlsb = struct.unpack_from(">HB", data, 5)
+                adc_pres = (p_msb << 4) | (p_xlsb >> 4)
+                adc_temp = (t_msb << 4) | (t_xlsb >> 4)
+                adc_hum = struct.unpack_from(">H", data, 8)[0]
+
+                # 温度・気圧・湿度計算（キャリブレーション適用済み）
+                # 気圧・湿度はt_fineを使うため温度を先に計算する
+                # 整数演算の結果をここで実数（℃ / hPa / %RH）に変換
+                result = self._result
+                result['temperature'] = self._calc_temperature(adc_temp) * 0.01
+                result['pressure'] = self._calc_pressure(adc_pres) * 0.01
+                result['humidity'] = self._calc_humidity(adc_hum) * 0.001
+                return result
 
             except Exception as e:
                 print(f"[エラー] I2C読み取り失敗 (試行 {attempt + 1}/{retries}): {e}")
                 if attempt < retries - 1:
-                    time.sleep_ms(100 * (attempt + 1))  # 再試行前に待機（指数バックオフ）
+                    time.sleep_ms(int(_backoff(attempt, base=100, cap=1000)))  # 再試行前に待機（指数バックオフ）
                 else:
                     print("[エラー] I2C読み取り最大再試行回数に達しました")
                     return None
 
+    @micropython.native
     def _calc_temperature(self, adc_temp):
-        """温度を計算（℃）"""
-        var1 = (adc_temp / 16384.0 - self.par_t1 / 1024.0) * self.par_t2
-        var2 = ((adc_temp / 131072.0 - self.par_t1 / 8192.0) *
-                (adc_temp / 131072.0 - self.par_t1 / 8192.0) * self.par_t3 * 16.0)
-        self.t_fine = var1 + var2
-        return self.t_fine / 5120.0
-
+        """温度を計算（0.01℃単位の整数、TEMP_OFFSET適用済み）"""
+        var1 = (adc_temp >> 3) - self._t1_x2
+        var2 = (var1 * self.par_t2) >> 11
+        var3 = ((var1 >> 1) * (var1 >> 1)) >> 12
+        var3 = (var3 * self._t3_x16) >> 14
+        self.t_fine = var2 + var3
+        return ((self.t_fine * 5 + 128) >> 8) + _TEMP_OFFSET_X100
+
+    @micropython.native
     def _calc_pressure(self, adc_pres):
-        """気圧を計算（hPa）"""
-        var1 = self.t_fine / 2.0 - 64000.0
-        var2 = var1 * var1 * self.par_p6 / 131072.0
-        var2 = var2 + var1 * self.par_p5 * 2.0
-        var2 = var2 / 4.0 + self.par_p4 * 65536.0
-        var1 = (self.par_p3 * var1 * var1 / 16384.0 + self.par_p2 * var1) / 524288.0
-        var1 = (1.0 + var1 / 32768.0) * self.par_p1
+        """気圧を計算（Pa単位の整数、PRESSURE_OFFSET適用済み）"""
+        var1 = (self.t_fine >> 1) - 64000
+        var1_sq = (var1 >> 2) * (var1 >> 2)
+        var2 = ((var1_sq >> 11) * self.par_p6) >> 2
+        var2 = var2 + ((var1 * self.par_p5) << 1)
+        var2 = (var2 >> 2) + self._p4_x65536
+        var1 = ((((var1_sq >> 13) * self._p3_x32) >> 3) + ((self.par_p2 * var1) >> 1)) >> 18
+        var1 = ((32768 + var1) * self.par_p1) >> 15
 
         if var1 == 0:
             return 0
 
-        pressure = 1048576.0 - adc_pres
-        pressure = (pressure - var2 / 4096.0) * 6250.0 / var1
-        var1 = self.par_p9 * pressure * pressure / 2147483648.0
-        var2 = pressure * self.par_p8 / 32768.0
-        var3 = (pressure / 256.0) ** 3 * self.par_p10 / 131072.0
+        pressure = (1048576 - adc_pres - (var2 >> 12)) * 3125
+        # 中間値を31bit以内に収める（Bosch実装と同じ分岐）
+        if pressure >= 0x40000000:
+            pressure = _div_trunc(pressure, var1) << 1
+        else:
+            pressure = _div_trunc(pressure << 1, var1)
+        var1 = (self.par_p9 * (((pressure >> 3) * (pressure >> 3)) >> 13)) >> 12
+        var2 = ((pressure >> 2) * self.par_p8) >> 13
+        p_s = pressure >> 8
+        var3 = (p_s * p_s * p_s * self.par_p10) >> 17
 
-        return (pressure + (var1 + var2 + var3 + self.par_p7 * 128.0) / 16.0) / 100.0
+        return pressure + ((var1 + var2 + var3 + self._p7_x128) >> 4) + _PRESSURE_OFFSET_PA
 
+    @micropython.native
     def _calc_humidity(self, adc_hum):
-        """湿度を計算（%RH）"""
-        temp_comp = self.t_fine / 5120.0
-
-        var1 = adc_hum - (self.par_h1 * 16.0 + (self.par_h3 / 2.0) * temp_comp)
-        var2 = var1 * (self.par_h2 / 262144.0 * (1.0 + (self.par_h4 / 16384.0) * temp_comp +
-               (self.par_h5 / 1048576.0) * temp_comp * temp_comp))
-        var3 = self.par_h6 / 16384.0
-        var4 = self.par_h7 / 2097152.0
-
-        humidity = var2 + (var3 + var4 * temp_comp) * var2 * var2
-
-        # 範囲制限
-        if humidity > 100.0:
-            humidity = 100.0
-        elif humidity < 0.0:
-            humidity = 0.0
+        """湿度を計算（0.001%RH単位の整数、HUMIDITY_OFFSET適用済み）"""
+        temp_scaled = (self.t_fine * 5 + 128) >> 8
+
+        var1 = (adc_hum - self._h1x16) - (_div_trunc(temp_scaled * self.par_h3, 100) >> 1)
+        var2 = (self.par_h2 * (_div_trunc(temp_scaled * self.par_h4, 100) +
+                _div_trunc((temp_scaled * _div_trunc(temp_scaled * self.par_h5, 100)) >> 6, 100) +
+                (1 << 14))) >> 10
+        var3 = var1 * var2
+        var4 = (self._h6_x128 + _div_trunc(temp_scaled * self.par_h7, 100)) >> 4
+        var5 = ((var3 >> 14) * (var3 >> 14)) >> 10
+        var6 = (var4 * var5) >> 1
+
+        humidity = ((((var3 + var6) >> 10) * 1000) >> 12) + _HUMIDITY_OFFSET_X1000
+
+        # 範囲制限（オフセット適用後）
+        if humidity > 100000:
+            humidity = 100000
+        elif humidity < 0:
+            humidity = 0
 
         return humidity
 
+    @micropython.native
     def _calc_gas_resistance(self, adc_gas, gas_range):
         """ガス抵抗値を計算（Ω）"""
         # BME680データシートに基づく計算
-        lookup_table1 = [1.0, 1.0, 1.0, 1.0, 1.0, 0.99, 1.0, 0.992,
-                         1.0, 1.0, 0.998, 0.995, 1.0, 0.99, 1.0, 1.0]
-        lookup_table2 = [8000000.0, 4000000.0, 2000000.0, 1000000.0,
-                         499500.4995, 248262.1648, 125000.0, 63004.03226,
-                         31281.28128, 15625.0, 7812.5, 3906.25,
-                         1953.125, 976.5625, 488.28125, 244.140625]
-
-        var1 = (1340.0 + 5.0 * self.range_sw_err) * lookup_table1[gas_range]
-        gas_resistance = var1 * lookup_table2[gas_range] / (adc_gas - 512.0 + var1)
+        var1 = (1340.0 + 5.0 * self.range_sw_err) * _GAS_LUT1[gas_range]
+        gas_resistance = var1 * _GAS_LUT2[gas_range] / (adc_gas - 512.0 + var1)
 
         if gas_resistance < 0:
             gas_resistance = 0
@@ -337,24 +410,50 @@ class BME680:
         return gas_resistance
 
 
+def _backoff(attempt, base=1.0, cap=30.0):
+    """
+    ジッター付き指数バックオフの待機時間を計算
+
+    Args:
+        attempt: 再試行回数（0始まり）
+        base: 初回の待機時間
+        cap: 待機時間の上限（ジッター適用前）
+
+    Returns:
+        float: 待機時間（base/capと同じ単位、上限適用後の値の1.0〜1.5倍）
+    """
+    return min(base * (1 << attempt), cap) * (1.0 + 0.5 * urandom.getrandbits(8) / 256.0)
+
+
+@micropython.native
 def sleep_with_wdt(total_s, wdt, step=1):
-    """WDTをfeedしながらスリープ"""
+    """WDTをfeedしながらスリープ（対応環境ではlightsleepで省電力待機）"""
     if wdt is None:
         time.sleep(total_s)
         return
-    elapsed = 0
-    while elapsed < total_s:
-        s = min(step, total_s - elapsed)
-        time.sleep(s)
+    # WDTが切れないよう1回の待機はタイムアウトの半分まで
+    step_ms = int(min(step, WDT_TIMEOUT_MS / 2000) * 1000)
+    total_ms = int(total_s * 1000)
+    use_lightsleep = LIGHTSLEEP_ENABLED and lightsleep is not None
+    # lightsleepは割り込みやWiFi処理で早期復帰するため、経過時間は実測する
+    start = time.ticks_ms()
+    while True:
+        remaining = total_ms - time.ticks_diff(time.ticks_ms(), start)
+        if remaining <= 0:
+            break
+        ms = min(step_ms, remaining)
+        if use_lightsleep:
+            lightsleep(ms)
+        else:
+            time.sleep_ms(ms)
         wdt.feed()
-        elapsed += s
 
 
 def reinit_i2c_and_sensor(wdt=None):
     """I2CとBME680センサーを再初期化"""
     print("[システム] I2Cとセンサーを再初期化中...")
     try:
-        i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=100000)
+        i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=I2C_FREQ)
         sleep_with_wdt(2, wdt, step=1)
         sensor = BME680(i2c)
         print("[システム] I2C再初期化成功")
@@ -364,6 +463,45 @@ def reinit_i2c_and_sensor(wdt=None):
         return None, None
 
 
+# 直近のWiFiスキャン結果と前回接続できたSSIDの番号（connect_wifiで再利用）
+_last_scan = []
+_last_scan_time = 0
+_last_ssid_idx = None
+
+
+def _try_connect(wlan, ssid, password, wdt=None):
+    """
+    指定SSIDへ接続し、最大20秒待機する
+
+    Returns:
+        bool: 接続成功時True、失敗時False
+    """
+    try:
+        wlan.connect(ssid, password)
+
+        # 接続待機（最大20秒）
+        for _ in range(20):
+            if wlan.isconnected():
+                ip = wlan.ifconfig()[0]
+                print(f"[WiFi] 接続成功: {ip}")
+                return True
+            time.sleep(1)
+            if wdt:
+                wdt.feed()
+
+        print(f"[WiFi] '{ssid}' への接続タイムアウト")
+        wlan.disconnect()
+
+    except Exception as e:
+        print(f"[エラー] '{ssid}' への接続失敗: {e}")
+        try:
+            wlan.disconnect()
+        except:
+            pass
+
+    return False
+
+
 def connect_wifi(retry_count=0, wdt=None):
     """
     WiFiに接続（複数SSID対応、指数バックオフ）
@@ -385,55 +523,142 @@ def connect_wifi(retry_count=0, wdt=None):
 
     # 指数バックオフ待機（再試行時）
     if retry_count > 0:
-        wait_time = min(2 ** (retry_count - 1), 60)
-        print(f"[WiFi] 再試行前に{wait_time}秒待機...")
+        wait_time = _backoff(retry_count - 1, base=1.0, cap=60.0)
+        print(f"[WiFi] 再試行前に{wait_time:.1f}秒待機...")
         sleep_with_wdt(wait_time, wdt)
 
-    print("[WiFi] ネットワークをスキャン中...")
-    if wdt:
-        wdt.feed()
-    try:
-        scan_results = wlan.scan()
-        available_networks = [net[0].decode() for net in scan_results]
-        print(f"[WiFi] 検出されたネットワーク: {available_networks}")
-    except Exception as e:
-        print(f"[エラー] WiFiスキャン失敗: {e}")
-        return None
+    global _last_scan, _last_scan_time, _last_ssid_idx
+
+    # 初回試行時は前回接続できたSSIDにスキャンなしで接続を試す
+    tried_idx = None
+    if _last_ssid_idx is not None and retry_count == 0:
+        wifi = WIFI_NETWORKS[_last_ssid_idx]
+        print(f"[WiFi] 前回の接続先 '{wifi['ssid']}' に接続中...")
+        if _try_connect(wlan, wifi["ssid"], wifi["password"], wdt):
+            return wlan
+        tried_idx = _last_ssid_idx
+
+    if len(WIFI_NETWORKS) == 1:
+        # SSIDが1つだけならスキャンせず直接接続を試す
+        available_networks = None
+    elif _last_scan and time.time() - _last_scan_time < WIFI_SCAN_CACHE_S:
+        available_networks = _last_scan
+        print(f"[WiFi] 直近のスキャン結果を再利用: {available_networks}")
+    else:
+        print("[WiFi] ネットワークをスキャン中...")
+        if wdt:
+            wdt.feed()
+        try:
+            scan_results = wlan.scan()
+            available_networks = [net[0].decode() for net in scan_results]
+            print(f"[WiFi] 検出されたネットワーク: {available_networks}")
+        except Exception as e:
+            print(f"[エラー] WiFiスキャン失敗: {e}")
+            return None
+        _last_scan = available_networks
+        _last_scan_time = time.time()
 
-    # 優先順位順にSSIDを試す
+    # 優先順位順にSSIDを試す（前回接続先で試行済みのものは除く）
     for wifi_idx, wifi in enumerate(WIFI_NETWORKS):
+        if wifi_idx == tried_idx:
+            continue
         ssid = wifi["ssid"]
-        password = wifi["password"]
 
-        if ssid in available_networks:
+        if available_networks is None or ssid in available_networks:
             print(f"[WiFi] '{ssid}' に接続中... (優先度 {wifi_idx + 1}/{len(WIFI_NETWORKS)})")
-            try:
-                wlan.connect(ssid, password)
-
-                # 接続待機（最大20秒）
-                for _ in range(20):
-                    if wlan.isconnected():
-                        ip = wlan.ifconfig()[0]
-                        print(f"[WiFi] 接続成功: {ip}")
-                        return wlan
-                    time.sleep(1)
-                    if wdt:
-                        wdt.feed()
-
-                print(f"[WiFi] '{ssid}' への接続タイムアウト")
-                wlan.disconnect()
-
-            except Exception as e:
-                print(f"[エラー] '{ssid}' への接続失敗: {e}")
-                try:
-                    wlan.disconnect()
-                except:
-                    pass
+            if _try_connect(wlan, ssid, wifi["password"], wdt):
+                _last_ssid_idx = wifi_idx
+                return wlan
 
     print("[WiFi] 利用可能なネットワークに接続できませんでした")
     return None
 
 
+# ホスト名 → 接続先アドレスのキャッシュ（http_post_jsonで使用）
+_addr_cache = {}
+
+
+class HttpConnectError(OSError):
+    """接続（connect）の失敗。リクエストは未送信"""
+
+
+class HttpResponseError(OSError):
+    """リクエスト送信後の失敗。Ambient側で登録済みの可能性がある"""
+
+
+def http_post_json(host, path, body, timeout=HTTP_TIMEOUT_S, wdt=None):
+    """
+    JSONをHTTP/1.0でPOSTする（urequestsを使わない最小実装）
+
+    Args:
+        host: 送信先ホスト名
+        path: リクエストパス
+        body: 送信するJSON（bytes）
+        timeout: ソケット操作1回ごとのタイムアウト（秒）
+        wdt: ウォッチドッグタイマー（None可）
+
+    Returns:
+        int: HTTPステータスコード
+
+    Raises:
+        OSError: 名前解決に失敗した場合（リクエスト未送信）
+        HttpConnectError: 接続に失敗した場合（リクエスト未送信）
+        HttpResponseError: リクエスト送信後に失敗した場合
+    """
+    # 名前解決の結果はキャッシュして再送・次回送信で再利用
+    addr = _addr_cache.get(host)
+    if addr is None:
+        addr = usocket.getaddrinfo(host, 80)[0][-1]
+        _addr_cache[host] = addr
+    if wdt:
+        wdt.feed()
+    sock = usocket.socket()
+    try:
+        try:
+            sock.settimeout(timeout)
+            sock.connect(addr)
+        except OSError as e:
+            # 接続先が変わった可能性があるため次回は名前解決し直す
+            _addr_cache.pop(host, None)
+            raise HttpConnectError(e)
+        if wdt:
+            wdt.feed()
+        try:
+            header = ("POST %s HTTP/1.0\r\n"
+                      "Host: %s\r\n"
+                      "Content-Type: application/json\r\n"
+                      "Content-Length: %d\r\n\r\n" % (path, host, len(body)))
+            sock.write(header.encode() + body)
+            # ステータス行のみ読み取る（例: b"HTTP/1.1 200 OK\r\n"）
+            status_line = sock.readline()
+            return int(status_line.split(None, 2)[1])
+        except (OSError, ValueError, IndexError) as e:
+            raise HttpResponseError(e)
+    finally:
+        sock.close()
+
+
+def http_post_json_urequests(host, path, body, timeout=HTTP_TIMEOUT_S):
+    """
+    urequestsでJSONをPOSTする（ソケット接続失敗時のフォールバック）
+
+    Returns:
+        int: HTTPステータスコード
+    """
+    import urequests  # フォールバック時のみ読み込む
+    url = "http://" + host + path
+    headers = {"Content-Type": "application/json"}
+    try:
+        response = urequests.post(url, data=body, headers=headers, timeout=timeout)
+    except TypeError:
+        print("[Ambient] timeout未対応、タイムアウトなしで送信")
+        response = urequests.post(url, data=body, headers=headers)
+    try:
+        return response.status_code
+    finally:
+        response.close()
+
+
 def send_to_ambient(data, retries=HTTP_MAX_RETRIES, wdt=None):
     """
     Ambientにデータを送信（再試行機能付き）
@@ -446,37 +671,26 @@ def send_to_ambient(data, retries=HTTP_MAX_RETRIES, wdt=None):
     Returns:
         bool: 送信成功時True、失敗時False
     """
-    url = f"http://ambidata.io/api/v2/channels/{AMBIENT_CHANNEL_ID}/data"
-
-    payload = {
-        "writeKey": AMBIENT_WRITE_KEY,
-        "d1": round(data['temperature'], 1),
-        "d2": round(data['humidity'], 1),
-        "d3": round(data['pressure'], 1),
-    }
+    payload = _AMBIENT_PAYLOAD
+    payload["d1"] = round(data['temperature'], 1)
+    payload["d2"] = round(data['humidity'], 1)
+    payload["d3"] = round(data['pressure'], 1)
+    body = json.dumps(payload).encode()
 
     for attempt in range(retries):
-        response = None
         try:
             if wdt:
                 wdt.feed()
             try:
-                response = urequests.post(
-                    url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"},
-                    timeout=5
-                )
-            except TypeError:
-                print("[Ambient] timeout未対応、タイムアウトなしで送信")
-                response = urequests.post(
-                    url,
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                )
+                status = http_post_json(AMBIENT_HOST, _AMBIENT_PATH, body, wdt=wdt)
+            except HttpConnectError as e:
+                # 接続失敗時のみフォールバック（名前解決の失敗はurequestsでも同じため再試行で対応）
+                print(f"[Ambient] ソケット接続失敗 ({e})、urequestsで再送")
+                if wdt:
+                    wdt.feed()  # ソケット側の接続タイムアウト分を回復
+                status = http_post_json_urequests(AMBIENT_HOST, _AMBIENT_PATH, body)
             if wdt:
                 wdt.feed()
-            status = response.status_code
 
             if status == 200:
                 print("[Ambient] 送信成功")
@@ -484,87 +698,43 @@ def send_to_ambient(data, retries=HTTP_MAX_RETRIES, wdt=None):
             else:
                 print(f"[エラー] Ambient送信失敗: HTTP {status} (試行 {attempt + 1}/{retries})")
 
+        except HttpResponseError as e:
+            # 送信済みのデータを再送すると重複登録になるため、再試行せず失敗とする
+            print(f"[エラー] Ambient送信後に応答取得失敗、再送しません: {e}")
+            return False
+
         except Exception as e:
             print(f"[エラー] Ambient送信例外 (試行 {attempt + 1}/{retries}): {e}")
 
-        finally:
-            if response is not None:
-                try:
-                    response.close()
-                except:
-                    pass
-            gc.collect()
-
         # 再試行前に待機
         if attempt < retries - 1:
-            sleep_with_wdt(2 * (attempt + 1), wdt)
+            sleep_with_wdt(_backoff(attempt, base=2.0, cap=30.0), wdt)
 
     print("[エラー] Ambient送信最大再試行回数に達しました")
     return False
 
 
-def estimate_iaq(gas_resistance, humidity):
-    """
-    簡易的な室内空気質（IAQ）スコアを推定
-    ※ 実際のIAQ計算にはBosch独自のアルゴリズムが必要
-
-    Returns: 0-500 (低いほど良い)
-    """
-    if gas_resistance is None:
-        return None
+def maybe_gc(threshold=GC_FREE_THRESHOLD):
+    """空きメモリがしきい値未満の場合のみガベージコレクションを実行"""
+    if gc.mem_free() < threshold:
+        gc.collect()
 
-    # 基準値（クリーンな空気での典型的な値）
-    gas_baseline = 50000  # Ω
-    hum_baseline = 40.0   # %
 
-    # ガス抵抗の寄与（75%）
-    gas_score = (gas_resistance / gas_baseline) * 100
-    if gas_score > 100:
-        gas_score = 100
-
-    # 湿度の寄与（25%）- 40%が理想
-    if humidity < hum_baseline:
-        hum_score = (humidity / hum_baseline) * 100
-    else:
-        hum_score = (100 - humidity) / (100 - hum_baseline) * 100
-    if hum_score > 100:
-        hum_score = 100
-
-    # 合成スコア（逆転: 高いほど良い → 低いほど良い）
-    iaq = 500 - (gas_score * 0.75 + hum_score * 0.25) * 5
-
-    return max(0, min(500, iaq))
-
-
-def get_iaq_category(iaq):
-    """IAQスコアからカテゴリを判定"""
-    if iaq is None:
-        return "計測中..."
-    elif iaq <= 50:
-        return "優良 (Excellent)"
-    elif iaq <= 100:
-        return "良好 (Good)"
-    elif iaq <= 150:
-        return "軽度汚染 (Lightly Polluted)"
-    elif iaq <= 200:
-        return "中度汚染 (Moderately Polluted)"
-    elif iaq <= 300:
-        return "重度汚染 (Heavily Polluted)"
-    else:
-        return "危険 (Severely Polluted)"
-
-
-def print_memory_info():
-    """メモリ使用状況を表示"""
+def memory_info_line():
+    """メモリ使用状況の表示行を返す（取得できない場合は空文字列）"""
     try:
-        import micropython
         free = gc.mem_free()
         alloc = gc.mem_alloc()
         total = free + alloc
         usage_percent = (alloc / total) * 100
-        print(f"[メモリ] 使用: {alloc} bytes / 空き: {free} bytes ({usage_percent:.1f}% 使用)")
+        return "[メモリ] 使用: %d bytes / 空き: %d bytes (%.1f%% 使用)\n" % (alloc, free, usage_percent)
     except:
-        pass
+        return ""
+
+
+def print_memory_info():
+    """メモリ使用状況を表示"""
+    sys.stdout.write(memory_info_line())
 
 
 def system_selfcheck():
@@ -597,7 +767,7 @@ def system_selfcheck():
     # 2. I2Cデバイスチェック
     print("[チェック 2/4] I2Cデバイス確認...")
     try:
-        i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=100000)
+        i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=I2C_FREQ)
         time.sleep_ms(100)
         devices = i2c.scan()
         if BME680_ADDR in devices or 0x76 in devices:
@@ -670,16 +840,13 @@ def main():
     print("WDT初期化完了")
     print()
 
-    # 起動時の安定化待機
-    print("システム初期化中...")
-    time.sleep(5)
-    wdt.feed()  # WDT feed
-
     # I2C初期化（ピン1=GP0=SDA, ピン2=GP1=SCL）
     # ハードウェアI2Cを使用
-    i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=100000)
-    time.sleep(2)
-    wdt.feed()  # WDT feed
+    i2c = I2C(0, sda=Pin(0), scl=Pin(1), freq=I2C_FREQ)
+
+    # 起動時の安定化待機（I2Cバスの安定化も兼ねる、WDTをfeedしながら待機）
+    print("システム初期化中...")
+    sleep_with_wdt(5, wdt, step=1)
 
     # I2Cスキャン
     print("I2Cデバイスをスキャン中...")
@@ -711,10 +878,11 @@ def main():
 
     print()
     print(f"計測を開始します（送信間隔: {SEND_INTERVAL}秒）")
-    print("-" * 50)
+    print(SEP)
     print()
 
-    last_send_time = 0  # 初回は即座に送信
+    send_interval_ms = SEND_INTERVAL * 1000
+    last_send_ms = time.ticks_add(time.ticks_ms(), -send_interval_ms)  # 初回は即座に送信
     i2c_fail_count = 0  # I2C連続失敗カウンタ
     wifi_retry_count = 0  # WiFi再試行カウンタ
     loop_count = 0  # ループカウンタ
@@ -725,12 +893,12 @@ def main():
             loop_count += 1
 
             # データ読み取り
-            data = sensor.read_data()
+            data = sensor.read_data(wdt=wdt)
 
             if data is None:
                 # データ読み取り失敗
                 i2c_fail_count += 1
-                print(f"[警告] I2C連続失敗回数: {i2c_fail_count}/{I2C_FAIL_THRESHOLD}")
+                print("[警告] I2C連続失敗回数: %d/%d" % (i2c_fail_count, I2C_FAIL_THRESHOLD))
 
                 if i2c_fail_count >= I2C_FAIL_THRESHOLD:
                     print("[システム] I2C連続失敗しきい値に到達、再初期化します")
@@ -750,14 +918,20 @@ def main():
                 # データ読み取り成功、失敗カウンタリセット
                 i2c_fail_count = 0
 
-            # 現在時刻
+            # 現在時刻（表示用）
             current_time = time.time()
 
-            # コンソール出力
-            print(f"【計測時刻】{current_time}")
-            print(f"  温度:       {data['temperature']:.1f} °C")
-            print(f"  湿度:       {data['humidity']:.1f} %RH")
-            print(f"  気圧:       {data['pressure']:.1f} hPa")
+            # コンソール出力は1ループ分をまとめて1回で書き出す
+            # （PRINT_EVERY_N回に1回詳細表示、それ以外は1行要約）
+            if (loop_count - 1) % PRINT_EVERY_N == 0:
+                out = ("【計測時刻】%d\n"
+                       "  温度:       %.1f °C\n"
+                       "  湿度:       %.1f %%RH\n"
+                       "  気圧:       %.1f hPa\n" % (
+                           current_time, data['temperature'], data['humidity'], data['pressure']))
+            else:
+                out = "【計測】%d  %.1f°C  %.1f%%RH  %.1fhPa\n" % (
+                    current_time, data['temperature'], data['humidity'], data['pressure'])
 
             wdt.feed()  # データ読み取り後にWDT feed
 
@@ -766,42 +940,49 @@ def main():
                 # WiFi接続中、再試行カウンタリセット
                 wifi_retry_count = 0
 
-                if current_time - last_send_time >= SEND_INTERVAL:
-                    print("  → Ambientに送信中...")
+                now_ms = time.ticks_ms()
+                elapsed_ms = time.ticks_diff(now_ms, last_send_ms)
+                # 長時間の未接続でticks_diffの範囲を超えた場合（負値）も送信する
+                if elapsed_ms >= send_interval_ms or elapsed_ms < 0:
+                    # 送信処理のログより前に計測結果を出力しておく
+                    sys.stdout.write(out + "  → Ambientに送信中...\n")
+                    out = ""
                     if send_to_ambient(data, wdt=wdt):
-                        last_send_time = current_time
+                        last_send_ms = now_ms
                         next_send = SEND_INTERVAL
                     else:
-                        last_send_time = current_time
+                        # 失敗時は60秒後に再送（経過時間が送信間隔に達する時刻を前倒し）
+                        last_send_ms = time.ticks_add(now_ms, (60 - SEND_INTERVAL) * 1000)
                         next_send = 60
-                    print(f"  → 次回送信まで: {next_send}秒")
+                    out = "  → 次回送信まで: %d秒\n" % next_send
                     wdt.feed()
-                    gc.collect()
                 else:
-                    remaining = SEND_INTERVAL - (current_time - last_send_time)
-                    print(f"  → 次回送信まで: {int(remaining)}秒")
+                    remaining = SEND_INTERVAL - elapsed_ms // 1000
+                    out += "  → 次回送信まで: %d秒\n" % remaining
             else:
                 # WiFi再接続を試行（指数バックオフ）
-                print(f"  → WiFi未接続（再接続試行 {wifi_retry_count + 1}/{WIFI_MAX_RETRIES}）")
+                # 接続処理のログより前に計測結果を出力しておく
+                sys.stdout.write(out + "  → WiFi未接続（再接続試行 %d/%d）\n" % (
+                    wifi_retry_count + 1, WIFI_MAX_RETRIES))
+                out = ""
                 wlan = connect_wifi(retry_count=wifi_retry_count, wdt=wdt)
                 if wlan is None:
                     wifi_retry_count = min(wifi_retry_count + 1, WIFI_MAX_RETRIES)
                 else:
                     wifi_retry_count = 0
                 wdt.feed()
-                gc.collect()
 
             # 10ループごとにメモリ情報表示
             if loop_count % 10 == 0:
-                print_memory_info()
+                out += memory_info_line()
 
-            print("-" * 50)
+            sys.stdout.write(out + SEP + "\n")
 
-            # メモリクリーンアップ
-            gc.collect()
+            # メモリクリーンアップ（空きメモリが少ない場合のみ）
+            maybe_gc()
 
             # 30秒待機（ローカル表示用）
-            sleep_with_wdt(30, wdt, step=5)
+            sleep_with_wdt(30, wdt, step=1)
 
     except KeyboardInterrupt:
         print()